@@ -5,30 +5,123 @@ import pygame
 import sys
 import os
 import socket
+import select
 import struct
+import numpy as np
 import matplotlib.pyplot as plt
-from collections import deque
+from collections import namedtuple
 import threading
-
-def get_speed(vehicle):
-    velocity = vehicle.get_velocity()
-    return math.sqrt(velocity.x**2 + velocity.y**2 + velocity.z**2)
+import multiprocessing
+import queue
+import logging
+import gc
+
+# Traces par tick désactivées par défaut (AEB_DEBUG=1 pour les activer)
+log = logging.getLogger("aeb")
+if os.environ.get("AEB_DEBUG") == "1":
+    logging.basicConfig(level=logging.DEBUG)
+    log.setLevel(logging.DEBUG)
+else:
+    log.setLevel(logging.WARNING)
+
+_INF = float('inf')
+
+# Mode sans affichage (AEB_HEADLESS=1) : pas de rendu CARLA, de HUD, de caméra
+# ni de graphiques, et pas de limitation au temps réel
+HEADLESS = os.environ.get("AEB_HEADLESS") == "1"
+
+# Fin d'un essai sans affichage : collision, ego arrêté après avoir roulé, ou durée max
+_HEADLESS_MAX_TIME_S = 30.0
+_EGO_MOVING_SPEED = 1.0
+_EGO_STOPPED_SPEED = 0.1
+
+# Pas de simulation CARLA (mode synchrone)
+FIXED_DELTA = 0.02 if HEADLESS else 0.05
+
+# Format binaire fixé pour l'échange avec Simulink (doubles little-endian)
+_SEND_STRUCT = struct.Struct('<3d')
+_RECV_STRUCT = struct.Struct('<4d')
+
+# Tampon de réception préalloué (une réponse Simulink = 4 doubles), conservé d'un
+# tick à l'autre : _rx_got octets d'une réponse partielle y sont déjà présents
+_RX_BUF = bytearray(_RECV_STRUCT.size)
+_RX_VIEW = memoryview(_RX_BUF)
+_rx_got = 0
+
+# Tampon d'émission préalloué : au plus une requête en vol. _tx_sent octets de la
+# requête courante sont déjà partis ; _awaiting_reply reste vrai jusqu'à sa réponse
+_TX_BUF = bytearray(_SEND_STRUCT.size)
+_TX_VIEW = memoryview(_TX_BUF)
+_tx_sent = _SEND_STRUCT.size
+_awaiting_reply = False
+
+# Âge maximal (s) de la dernière réponse Simulink avant d'activer l'AEB local
+_STALE_REPLY_S = 0.25
+
+# Mode sans affichage : attente maximale (s, temps réel) de la réponse Simulink à
+# chaque tick, l'échange se faisant en lockstep avec la simulation
+_LOCKSTEP_TIMEOUT_S = 2.0
+
+# Période (s de simulation) des collectes GC complètes pendant la boucle
+_GC_PERIOD_S = 30.0
+
+# Caméra spectateur : recul, hauteur et seuils en dessous desquels la pose n'est pas renvoyée
+_CAM_DIST = 17.0
+_CAM_HEIGHT = 12.0
+_CAM_YAW_EPS = 0.5
+_CAM_POS_EPS = 0.05
+
+# Valeurs affichées par le HUD à chaque rafraîchissement
+HudState = namedtuple('HudState', [
+    'ego_speed', 'cyclist_speed', 'distance', 'ttc', 'throttle', 'brake',
+    'aeb', 'fcw', 'local_brake', 'collision', 'tcp'
+])
+
+_WHITE = (255, 255, 255)
+_RED = (255, 0, 0)
+_ORANGE = (255, 165, 0)
+
+def _white(s):
+    return _WHITE
+
+# Description statique du HUD : (libellé, valeur, couleur) ; None = ligne vide
+HUD_SPECS = [
+    ("Vitesse Ego:", lambda s: "%.1f km/h" % (s.ego_speed*3.6,), _white),
+    ("Vitesse Cycliste:", lambda s: "%.1f km/h" % (s.cyclist_speed*3.6,), _white),
+    ("Distance:", lambda s: "%.2f m" % (s.distance,), _white),
+    ("TTC:", lambda s: "%.2f s" % (s.ttc,) if s.ttc != _INF else "∞",
+     lambda s: _RED if s.ttc < 2.0 else _WHITE),
+    None,
+    ("Accélérateur:", lambda s: "%.2f" % (s.throttle,), _white),
+    ("Frein:", lambda s: "%.2f" % (s.brake,), _white),
+    ("AEB Actif:", lambda s: str(s.aeb), lambda s: _ORANGE if s.aeb else _WHITE),
+    ("FCW:", lambda s: str(s.fcw), lambda s: _ORANGE if s.fcw else _WHITE),
+    ("AEB Local:", lambda s: str(s.local_brake), lambda s: _ORANGE if s.local_brake else _WHITE),
+    ("Collision:", lambda s: str(s.collision), lambda s: _RED if s.collision else _WHITE),
+    ("TCP:", lambda s: 'Actif' if s.tcp else 'Inactif', _white),
+]
 
 def calculate_ttc(distance, relative_velocity):
     """Calcule le Time-To-Collision"""
     if relative_velocity <= 0:
-        return float('inf')  # Pas de collision si vitesse relative <= 0
+        return _INF  # Pas de collision si vitesse relative <= 0
     return distance / relative_velocity
 
+def local_aeb(distance, relative_velocity, ttc):
+    """AEB de secours calculé localement, utilisé seulement si Simulink ne répond plus"""
+    return ttc < 1.5 or (distance < 5.0 and relative_velocity > 2.0)
+
 def setup_tcp_server(port=9001):
     sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
     sock.bind(('localhost', port))
     sock.listen(1)
     print(f"En attente de connexion Simulink sur le port {port}...")
     try:
         connection, addr = sock.accept()
-        connection.settimeout(0.1)  # Timeout plus court comme dans le script 2
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # Pas de Nagle: envoi immédiat
+        connection.setblocking(False)  # Échange en pipeline : la boucle n'attend jamais Simulink
         print(f"Connexion Simulink établie depuis {addr}")
         return connection, sock
     except Exception as e:
@@ -36,54 +129,82 @@ def setup_tcp_server(port=9001):
         sock.close()
         return None, None
 
+def _flush_send(conn):
+    """Envoie sans bloquer ce qui reste de la requête courante"""
+    global _tx_sent
+    size = _SEND_STRUCT.size
+    while _tx_sent < size:
+        try:
+            n = conn.send(_TX_VIEW[_tx_sent:])
+        except BlockingIOError:
+            break  # Tampon d'envoi plein : la fin partira à un tick suivant
+        _tx_sent += n
+
 def send_data(conn, data):
-    try:
+    """Émet une requête Simulink si aucune n'attend de réponse.
+    
+    Retourne True si une nouvelle requête a été prise en compte, False si la
+    précédente est encore en vol (les données du tick sont alors ignorées).
+    """
+    global _tx_sent, _awaiting_reply
+    queued = False
+    if not _awaiting_reply:
         values = [data['MIO_Distance'], data['MIO_Velocity'], data['Ego_Velocity']]
-        for val in values:
-            conn.sendall(struct.pack('d', float(val)))
-        print(f"Données envoyées: {values}")
-    except Exception as e:
-        print(f"Erreur d'envoi: {e}")
-        raise
+        _SEND_STRUCT.pack_into(_TX_BUF, 0, float(values[0]), float(values[1]), float(values[2]))
+        _tx_sent = 0
+        _awaiting_reply = True
+        queued = True
+        log.debug("Données envoyées: %s", values)
+    _flush_send(conn)
+    return queued
 
 def receive_data(conn):
-    try:
-        values = []
-        for _ in range(4):  # Recevoir 4 valeurs comme dans le script 2
-            try:
-                data = conn.recv(8)
-                if len(data) < 8:
-                    print("Données incomplètes reçues, réessai...")
-                    time.sleep(0.01)
-                    continue
-                values.append(struct.unpack('d', data)[0])
-            except socket.timeout:
-                print("Timeout en attente de données")
-                return {
-                    'egoCarStop': False,
-                    'FCW_Activate': False,
-                    'Deceleration': 0.0,
-                    'AEB_Status': False
-                }
-        
-        # Structure de données simplifiée
-        result = {
-            'egoCarStop': bool(round(values[0])),
-            'FCW_Activate': bool(round(values[1])),
-            'Deceleration': float(values[2]),
-            'AEB_Status': bool(round(values[3]))
-        }
-        print(f"Données reçues: {result}")
-        return result
-        
-    except Exception as e:
-        print(f"Erreur de réception: {e}")
-        return {
-            'egoCarStop': False,
-            'FCW_Activate': False,
-            'Deceleration': 0.0,
-            'AEB_Status': False
-        }
+    """Lit sans bloquer les réponses Simulink déjà arrivées.
+    
+    Retourne la plus récente réponse complète, ou None si aucune n'est disponible
+    (elle sera alors consommée à un tick suivant).
+    """
+    global _rx_got, _awaiting_reply
+    result = None
+    size = _RECV_STRUCT.size
+    while True:
+        try:
+            n = conn.recv_into(_RX_VIEW[_rx_got:], size - _rx_got)
+        except BlockingIOError:
+            break
+        if n == 0:
+            raise ConnectionError("Connexion Simulink fermée")
+        _rx_got += n
+        if _rx_got == size:
+            v0, v1, v2, v3 = _RECV_STRUCT.unpack_from(_RX_BUF)
+            _rx_got = 0
+            _awaiting_reply = False
+            
+            # Structure de données simplifiée
+            result = {
+                'egoCarStop': bool(round(v0)),
+                'FCW_Activate': bool(round(v1)),
+                'Deceleration': float(v2),
+                'AEB_Status': bool(round(v3))
+            }
+    
+    if result is not None:
+        log.debug("Données reçues: %s", result)
+    return result
+
+def wait_reply(conn, timeout):
+    """Attend (au plus timeout s) la réponse à la requête en vol ; None si délai dépassé"""
+    deadline = time.monotonic() + timeout
+    while True:
+        _flush_send(conn)
+        reply = receive_data(conn)
+        if reply is not None:
+            return reply
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        pending_send = [conn] if _tx_sent < _SEND_STRUCT.size else []
+        select.select([conn], pending_send, [], remaining)
 
 def initialize_carla():
     client = carla.Client('localhost', 2000)
@@ -92,7 +213,8 @@ def initialize_carla():
     time.sleep(1)
     settings = world.get_settings()
     settings.synchronous_mode = True
-    settings.fixed_delta_seconds = 0.05
+    settings.fixed_delta_seconds = FIXED_DELTA
+    settings.no_rendering_mode = HEADLESS
     world.apply_settings(settings)
     return client, world
 
@@ -110,7 +232,20 @@ def setup_weather_rain(world):
     )
     world.set_weather(weather)
 
-def spawn_actors(world):
+def setup_realtime_process():
+    # Réduit la gigue de la boucle de contrôle : cœur dédié, priorité plus haute
+    if hasattr(os, 'sched_setaffinity'):
+        try:
+            cpus = sorted(os.sched_getaffinity(0))
+            os.sched_setaffinity(0, {cpus[-1]})
+        except OSError as e:
+            print(f"[WARNING] Affinité CPU non appliquée: {e}")
+    try:
+        os.nice(-5)
+    except (OSError, AttributeError) as e:
+        print(f"[WARNING] Priorité non augmentée: {e}")
+
+def spawn_actors(client, world):
     bp_lib = world.get_blueprint_library()
 
     ego_bp = bp_lib.find('vehicle.audi.tt')
@@ -120,26 +255,32 @@ def spawn_actors(world):
     cyclist_bp = bp_lib.find('vehicle.bh.crossbike')
     cyclist_spawn = carla.Transform(carla.Location(x=8.0, y=-40.0, z=0.3), carla.Rotation(yaw=-86))
 
-    # Nettoyage
-    for actor in world.get_actors().filter('vehicle.*'):
-        actor.destroy()
+    # Nettoyage des véhicules restants en un seul lot, confirmé par le serveur
+    for resp in client.apply_batch_sync([
+            carla.command.DestroyActor(actor.id) for actor in world.get_actors().filter('vehicle.*')]):
+        if resp.has_error():
+            print(f"Erreur destruction acteur {resp.actor_id}: {resp.error}")
     time.sleep(0.5)
 
     ego = world.spawn_actor(ego_bp, ego_spawn)
-    cyclist = world.spawn_actor(cyclist_bp, cyclist_spawn)
+    try:
+        cyclist = world.spawn_actor(cyclist_bp, cyclist_spawn)
+    except Exception:
+        # main() ne reçoit pas encore l'ego : le détruire ici pour ne pas le laisser dans le monde
+        ego.destroy()
+        raise
 
     return ego, cyclist
 
 def control_cyclist(cyclist, sim_time):
     if sim_time > 2.0:
-        cyclist.apply_control(carla.VehicleControl(throttle=0.4, steer=0.0))
-    else:
-        cyclist.apply_control(carla.VehicleControl(throttle=0.0, brake=1.0))
+        return carla.VehicleControl(throttle=0.4, steer=0.0)
+    return carla.VehicleControl(throttle=0.0, brake=1.0)
 
-def control_ego(ego, sim_time, sim_data, collision):
+def control_ego(ego, sim_time, sim_data, collision, local_brake=False):
     control = carla.VehicleControl()
     
-    if sim_data['AEB_Status'] or sim_data['egoCarStop'] or collision:
+    if sim_data['AEB_Status'] or sim_data['egoCarStop'] or collision or local_brake:
         control.throttle = 0.0
         control.brake = 1.0
     else:
@@ -154,13 +295,15 @@ def control_ego(ego, sim_time, sim_data, collision):
     return control
 
 class RealTimePlotter:
+    # Fenêtre matplotlib : vit dans son propre processus (voir PlotterProcess)
     def __init__(self, max_points=200):
         self.max_points = max_points
-        self.times = deque(maxlen=max_points)
-        self.distances = deque(maxlen=max_points)
-        self.ttc_values = deque(maxlen=max_points)
-        self.ego_speeds = deque(maxlen=max_points)
-        self.cyclist_speeds = deque(maxlen=max_points)
+        # Tampon circulaire numpy (temps, distance, TTC, vitesse ego, vitesse cycliste).
+        # Chaque échantillon est écrit deux fois (i et i + max_points) pour que la
+        # fenêtre des max_points derniers points soit toujours une tranche contiguë.
+        self._buf = np.empty((5, 2 * max_points), dtype=np.float32)
+        self._idx = 0
+        self._n = 0
         
         # Configuration matplotlib pour éviter les conflits de thread
         plt.switch_backend('TkAgg')  # Backend plus stable
@@ -170,19 +313,28 @@ class RealTimePlotter:
             self.fig, (self.ax1, self.ax2, self.ax3) = plt.subplots(3, 1, figsize=(10, 8))
             self.fig.suptitle('Analyse AEB en Temps Réel - Conditions Pluvieuses')
             
-            # Configuration des axes
+            # Configuration des axes et des courbes (créées une seule fois)
+            self.line_dist, = self.ax1.plot([], [], 'b-', linewidth=2, label='Distance')
+            self.ax1.axhline(y=2.5, color='r', linestyle='--', label='Seuil collision')
             self.ax1.set_ylabel('Distance (m)')
             self.ax1.set_title('Distance Ego-Cycliste')
+            self.ax1.legend()
             self.ax1.grid(True)
             
+            self.line_ttc, = self.ax2.plot([], [], 'r-', linewidth=2, label='TTC')
+            self.ax2.axhline(y=1.5, color='orange', linestyle='--', label='TTC critique')
             self.ax2.set_ylabel('TTC (s)')
             self.ax2.set_title('Time-To-Collision')
-            self.ax2.grid(True)
             self.ax2.set_ylim(0, 10)
+            self.ax2.legend()
+            self.ax2.grid(True)
             
+            self.line_ego, = self.ax3.plot([], [], 'g-', linewidth=2, label='Ego')
+            self.line_cyc, = self.ax3.plot([], [], 'm-', linewidth=2, label='Cycliste')
             self.ax3.set_ylabel('Vitesse (m/s)')
             self.ax3.set_xlabel('Temps (s)')
             self.ax3.set_title('Vitesses des Véhicules')
+            self.ax3.legend()
             self.ax3.grid(True)
             
             plt.tight_layout()
@@ -193,87 +345,137 @@ class RealTimePlotter:
             print("[INFO] Continuer sans graphiques temps réel")
             self.plotting_enabled = False
     
-    def update(self, time_val, distance, ttc, ego_speed, cyclist_speed):
-        if not self.plotting_enabled:
-            return
-            
-        try:
-            self.times.append(time_val)
-            self.distances.append(distance)
-            self.ttc_values.append(min(ttc, 10))
-            self.ego_speeds.append(ego_speed)
-            self.cyclist_speeds.append(cyclist_speed)
-            
-            # Mise à jour moins fréquente pour éviter les conflits
-            if len(self.times) % 5 == 0:  # Mise à jour tous les 5 points
+    def run(self, samples):
+        # Boucle du processus de tracé : vide la file, redessine, puis laisse tourner Tk
+        while self.plotting_enabled:
+            received = False
+            try:
+                while True:
+                    sample = samples.get_nowait()
+                    if sample is None:  # Demande d'arrêt
+                        return
+                    self._push(sample)
+                    received = True
+            except queue.Empty:
+                pass
+            if received:
                 self._update_plots()
-        except Exception as e:
-            print(f"[WARNING] Erreur matplotlib: {e}")
-            self.plotting_enabled = False
+            plt.pause(0.25)
+    
+    def _push(self, sample):
+        max_points = self.max_points
+        self._buf[:, self._idx] = sample
+        self._buf[:, self._idx + max_points] = sample
+        self._idx = (self._idx + 1) % max_points
+        self._n = min(self._n + 1, max_points)
     
     def _update_plots(self):
         try:
-            # Mise à jour des graphiques
-            self.ax1.clear()
-            self.ax1.plot(list(self.times), list(self.distances), 'b-', linewidth=2, label='Distance')
-            self.ax1.axhline(y=2.5, color='r', linestyle='--', label='Seuil collision')
-            self.ax1.set_ylabel('Distance (m)')
-            self.ax1.set_title('Distance Ego-Cycliste')
-            self.ax1.legend()
-            self.ax1.grid(True)
+            if self._n < self.max_points:
+                window = self._buf[:, :self._n]
+            else:
+                window = self._buf[:, self._idx:self._idx + self.max_points]
+            times, distances, ttc_values, ego_speeds, cyclist_speeds = window
             
-            self.ax2.clear()
-            self.ax2.plot(list(self.times), list(self.ttc_values), 'r-', linewidth=2, label='TTC')
-            self.ax2.axhline(y=1.5, color='orange', linestyle='--', label='TTC critique')
-            self.ax2.set_ylabel('TTC (s)')
-            self.ax2.set_title('Time-To-Collision')
-            self.ax2.set_ylim(0, 10)
-            self.ax2.legend()
-            self.ax2.grid(True)
+            # Mise à jour des données des courbes sans reconstruire les axes
+            self.line_dist.set_data(times, distances)
+            self.line_ttc.set_data(times, ttc_values)
+            self.line_ego.set_data(times, ego_speeds)
+            self.line_cyc.set_data(times, cyclist_speeds)
             
-            self.ax3.clear()
-            self.ax3.plot(list(self.times), list(self.ego_speeds), 'g-', linewidth=2, label='Ego')
-            self.ax3.plot(list(self.times), list(self.cyclist_speeds), 'm-', linewidth=2, label='Cycliste')
-            self.ax3.set_ylabel('Vitesse (m/s)')
-            self.ax3.set_xlabel('Temps (s)')
-            self.ax3.set_title('Vitesses des Véhicules')
-            self.ax3.legend()
-            self.ax3.grid(True)
+            for ax in (self.ax1, self.ax2, self.ax3):
+                ax.relim()
+                ax.autoscale_view()  # ax2 garde son ylim fixe (0, 10)
             
-            plt.draw()
-            plt.pause(0.001)  # Pause très courte
+            self.fig.canvas.draw_idle()
         except Exception as e:
             print(f"[WARNING] Erreur mise à jour graphique: {e}")
             self.plotting_enabled = False
 
+def _plotter_main(samples, max_points):
+    RealTimePlotter(max_points).run(samples)
+
+class PlotterProcess:
+    """Côté boucle de contrôle : transmet les échantillons au processus de tracé.
+    
+    matplotlib et sa boucle Tk tournent dans un processus séparé, de sorte qu'un
+    ralentissement de l'affichage ne retarde jamais world.tick().
+    """
+    def __init__(self, max_points=200):
+        ctx = multiprocessing.get_context('spawn')
+        self._samples = ctx.Queue(maxsize=1000)
+        self._proc = ctx.Process(target=_plotter_main, args=(self._samples, max_points), daemon=True)
+        self._proc.start()
+    
+    def update(self, time_val, distance, ttc, ego_speed, cyclist_speed):
+        # Appelé à chaque tick : jamais bloquant, l'échantillon est perdu si la file est pleine
+        try:
+            self._samples.put_nowait((time_val, distance, min(ttc, 10), ego_speed, cyclist_speed))
+        except queue.Full:
+            pass
+    
+    def close(self):
+        try:
+            self._samples.put_nowait(None)
+        except queue.Full:
+            pass
+        self._proc.join(timeout=1.0)
+        if self._proc.is_alive():
+            self._proc.terminate()
+        self._samples.cancel_join_thread()
+
 def main():
     conn = None
     sock = None
+    client = None
     world = None
+    ego = None
+    cyclist = None
+    plotter = None
     
     try:
-        pygame.init()
-        screen = pygame.display.set_mode((500, 300))
-        pygame.display.set_caption("HUD - Simulation AEB Pluie")
-        font = pygame.font.Font(None, 24)
-        font_small = pygame.font.Font(None, 20)
+        if not HEADLESS:
+            pygame.init()
+            screen = pygame.display.set_mode((500, 320))
+            pygame.display.set_caption("HUD - Simulation AEB Pluie")
+            # Seul QUIT est utile : les autres événements (souris, clavier) ne sont pas mis en file
+            pygame.event.set_blocked(None)
+            pygame.event.set_allowed([pygame.QUIT])
+            font = pygame.font.Font(None, 24)
+            font_small = pygame.font.Font(None, 20)
+
+            # Surfaces statiques du HUD rendues une seule fois
+            title_surf = font.render("SIMULATION AEB - CONDITIONS PLUVIEUSES", True, (255, 255, 0))
+            # (surface du libellé, position y, valeur, couleur) pour chaque ligne non vide
+            hud_rows = [
+                (font_small.render(spec[0], True, (200, 200, 200)), 45 + i * 22, spec[1], spec[2])
+                for i, spec in enumerate(HUD_SPECS) if spec is not None
+            ]
+            value_x = 10 + max(row[0].get_width() for row in hud_rows) + 8
+            clock = pygame.time.Clock()
 
         client, world = initialize_carla()
         
         # Configuration météo pluie
         setup_weather_rain(world)
         
-        ego, cyclist = spawn_actors(world)
+        ego, cyclist = spawn_actors(client, world)
         
         # Connexion TCP simplifiée
         conn, sock = setup_tcp_server(9001)
         
         # Initialisation du traceur temps réel
-        plotter = RealTimePlotter()
+        if not HEADLESS:
+            plotter = PlotterProcess()
 
-        clock = pygame.time.Clock()
+        spectator = world.get_spectator()
+        last_cam_pose = None  # (x, y, z, yaw) de l'ego lors du dernier placement caméra
+        _cos, _sin, _radians, _hypot = math.cos, math.sin, math.radians, math.hypot
         sim_time = 0.0
+        tick_i = 0  # Compteur entier : temps exact et cadencement par modulo
         collision = False
+        ticks_since_reply = 0
+        stale_ticks = max(1, round(_STALE_REPLY_S / FIXED_DELTA))
         
         # Structure de données par défaut simplifiée
         sim_data = {
@@ -284,20 +486,48 @@ def main():
         }
 
         print("[INFO] Simulation démarrée avec conditions pluvieuses")
+        if HEADLESS:
+            print(f"[INFO] Mode sans affichage (pas de {FIXED_DELTA} s, durée max {_HEADLESS_MAX_TIME_S} s)")
+        ego_moved = False
+
+        # Pas de pause GC imprévisible pendant la boucle : les objets créés à
+        # l'initialisation sont gelés, puis collecte complète explicite ci-dessous
+        setup_realtime_process()
+        gc.collect()
+        gc.freeze()
+        gc.disable()
+        gc_ticks = max(1, round(_GC_PERIOD_S / FIXED_DELTA))
 
         while True:
-            for e in pygame.event.get():
-                if e.type == pygame.QUIT:
+            if not HEADLESS:
+                pygame.event.pump()
+                if pygame.event.peek(pygame.QUIT):
                     return
 
             world.tick()
-            sim_time += 0.05
-
-            control_cyclist(cyclist, sim_time)
-
-            distance = ego.get_location().distance(cyclist.get_location())
-            ego_speed = get_speed(ego)
-            cyclist_speed = get_speed(cyclist)
+            tick_i += 1
+            sim_time = tick_i * FIXED_DELTA
+
+            cyclist_ctrl = control_cyclist(cyclist, sim_time)
+
+            # Un seul instantané du monde par tick au lieu d'une requête par attribut
+            snap = world.get_snapshot()
+            ego_s = snap.find(ego.id)
+            cyc_s = snap.find(cyclist.id)
+            ego_tf = ego_s.get_transform()
+            ego_loc = ego_tf.location
+            ego_rot = ego_tf.rotation
+            cyc_loc = cyc_s.get_transform().location
+            ego_vel = ego_s.get_velocity()
+            cyc_vel = cyc_s.get_velocity()
+
+            # Distance calculée directement depuis les coordonnées de l'instantané
+            dx = ego_loc.x - cyc_loc.x
+            dy = ego_loc.y - cyc_loc.y
+            dz = ego_loc.z - cyc_loc.z
+            distance = _hypot(dx, dy, dz)
+            ego_speed = _hypot(ego_vel.x, ego_vel.y, ego_vel.z)
+            cyclist_speed = _hypot(cyc_vel.x, cyc_vel.y, cyc_vel.z)
             
             # Calcul vitesse relative et TTC
             relative_velocity = ego_speed - cyclist_speed
@@ -306,79 +536,112 @@ def main():
             # Communication TCP simplifiée
             if conn:
                 try:
-                    send_data(conn, {
+                    inputs = {
                         'MIO_Distance': distance,
                         'MIO_Velocity': cyclist_speed,
                         'Ego_Velocity': ego_speed
-                    })
-                    sim_data = receive_data(conn)
+                    }
+                    if HEADLESS:
+                        # Lockstep : la réponse à ce tick est attendue avant le tick suivant,
+                        # le résultat ne dépend donc pas de la vitesse de la machine
+                        send_data(conn, inputs)
+                        reply = wait_reply(conn, _LOCKSTEP_TIMEOUT_S)
+                        if reply is None:
+                            log.warning("[TCP ERROR] Pas de réponse Simulink en %.1f s", _LOCKSTEP_TIMEOUT_S)
+                    else:
+                        # Réponse à la requête en vol si elle est arrivée, sinon on garde l'ancienne
+                        reply = receive_data(conn)
+                        # Nouvelle requête seulement une fois la précédente traitée
+                        send_data(conn, inputs)
+                    if reply is not None:
+                        sim_data = reply
+                        ticks_since_reply = 0
+                except ConnectionError as e:
+                    # Simulink déconnecté : on le signale une fois et on ferme la connexion
+                    log.warning("[TCP ERROR] Connexion Simulink perdue: %s", e)
+                    conn.close()
+                    conn = None
                 except Exception as e:
-                    print(f"[TCP ERROR]: {e}")
+                    log.debug("[TCP ERROR]: %s", e)
                     # Continuer avec les dernières valeurs connues
 
+            # AEB local uniquement si la réponse Simulink est trop ancienne (ou absente)
+            ticks_since_reply += 1
+            local_brake = ticks_since_reply > stale_ticks and local_aeb(distance, relative_velocity, ttc)
+
             # Contrôle ego simplifié
-            ctrl = control_ego(ego, sim_time, sim_data, collision)
-            ego.apply_control(ctrl)
+            ctrl = control_ego(ego, sim_time, sim_data, collision, local_brake)
 
             if distance < 2.5 and not collision:
                 print("[COLLISION] DETECTED!")
                 collision = True
 
+            # Condition d'arrêt de l'essai en mode sans affichage
+            if HEADLESS:
+                ego_moved = ego_moved or ego_speed > _EGO_MOVING_SPEED
+                if collision:
+                    outcome = "collision"
+                elif ego_moved and ego_speed < _EGO_STOPPED_SPEED:
+                    outcome = "ego arrêté"
+                elif sim_time >= _HEADLESS_MAX_TIME_S:
+                    outcome = "durée max atteinte"
+                else:
+                    outcome = None
+                if outcome:
+                    print(f"[INFO] Fin de l'essai à t={sim_time:.2f} s : {outcome} (distance {distance:.2f} m)")
+                    return
+
             # Mise à jour du graphique temps réel
-            plotter.update(sim_time, distance, ttc, ego_speed, cyclist_speed)
+            if plotter:
+                plotter.update(sim_time, distance, ttc, ego_speed, cyclist_speed)
 
-            # HUD simplifié
-            screen.fill((20, 20, 40))
-            
-            title_text = "SIMULATION AEB - CONDITIONS PLUVIEUSES"
-            title = font.render(title_text, True, (255, 255, 0))
-            screen.blit(title, (10, 10))
-            
-            hud_lines = [
-                f"Vitesse Ego: {ego_speed*3.6:.1f} km/h",
-                f"Vitesse Cycliste: {cyclist_speed*3.6:.1f} km/h",
-                f"Distance: {distance:.2f} m",
-                f"TTC: {ttc:.2f} s" if ttc != float('inf') else "TTC: ∞",
-                "",
-                f"Accélérateur: {ctrl.throttle:.2f}",
-                f"Frein: {ctrl.brake:.2f}",
-                f"AEB Actif: {sim_data['AEB_Status']}",
-                f"FCW: {sim_data['FCW_Activate']}",
-                f"Collision: {collision}",
-                f"TCP: {'Actif' if conn else 'Inactif'}"
-            ]
-            
-            for i, text in enumerate(hud_lines):
-                if text == "":
-                    continue
-                color = (255, 255, 255)
-                if "Collision: True" in text:
-                    color = (255, 0, 0)
-                elif "AEB Actif: True" in text or "FCW: True" in text:
-                    color = (255, 165, 0)
-                elif "TTC:" in text and ttc < 2.0 and ttc != float('inf'):
-                    color = (255, 0, 0)
+            # HUD simplifié, rafraîchi à 5 Hz : seules les valeurs sont rendues
+            if not HEADLESS and tick_i % 4 == 0:
+                screen.fill((20, 20, 40))
+                screen.blit(title_surf, (10, 10))
                 
-                txt = font_small.render(text, True, color)
-                screen.blit(txt, (10, 45 + i * 22))
-            
-            pygame.display.flip()
+                state = HudState(
+                    ego_speed, cyclist_speed, distance, ttc, ctrl.throttle, ctrl.brake,
+                    sim_data['AEB_Status'], sim_data['FCW_Activate'], local_brake, collision,
+                    conn is not None
+                )
+                
+                for label_surf, y, val_fn, color_fn in hud_rows:
+                    screen.blit(label_surf, (10, y))
+                    screen.blit(font_small.render(val_fn(state), True, color_fn(state)), (value_x, y))
+                
+                pygame.display.flip()
 
-            # Caméra spectateur
-            spectator = world.get_spectator()
-            ego_location = ego.get_location()
-            ego_rotation = ego.get_transform().rotation
-            
-            yaw_rad = math.radians(ego_rotation.yaw)
-            camera_x = ego_location.x - 17 * math.cos(yaw_rad)
-            camera_y = ego_location.y - 17 * math.sin(yaw_rad)
-            camera_z = ego_location.z + 12
-            camera_location = carla.Location(x=camera_x, y=camera_y, z=camera_z)
-            camera_rotation = carla.Rotation(pitch=-25, yaw=ego_rotation.yaw, roll=0)
-            
-            spectator.set_transform(carla.Transform(camera_location, camera_rotation))
+            cmds = [
+                carla.command.ApplyVehicleControl(cyclist.id, cyclist_ctrl),
+                carla.command.ApplyVehicleControl(ego.id, ctrl)
+            ]
 
-            clock.tick(20)
+            # Caméra spectateur, replacée seulement si la pose de l'ego a réellement bougé
+            yaw = ego_rot.yaw
+            if not HEADLESS and (last_cam_pose is None
+                    or abs(yaw - last_cam_pose[3]) >= _CAM_YAW_EPS
+                    or abs(ego_loc.x - last_cam_pose[0]) >= _CAM_POS_EPS
+                    or abs(ego_loc.y - last_cam_pose[1]) >= _CAM_POS_EPS
+                    or abs(ego_loc.z - last_cam_pose[2]) >= _CAM_POS_EPS):
+                yaw_rad = _radians(yaw)
+                camera_location = carla.Location(
+                    x=ego_loc.x - _CAM_DIST * _cos(yaw_rad),
+                    y=ego_loc.y - _CAM_DIST * _sin(yaw_rad),
+                    z=ego_loc.z + _CAM_HEIGHT
+                )
+                camera_rotation = carla.Rotation(pitch=-25, yaw=yaw, roll=0)
+                cmds.append(carla.command.ApplyTransform(spectator.id, carla.Transform(camera_location, camera_rotation)))
+                last_cam_pose = (ego_loc.x, ego_loc.y, ego_loc.z, yaw)
+
+            # Commandes du tick envoyées en un seul appel (do_tick=False, le tick reste explicite)
+            client.apply_batch_sync(cmds, False)
+
+            if tick_i % gc_ticks == 0:
+                gc.collect()
+
+            if not HEADLESS:
+                clock.tick(20)
 
     except KeyboardInterrupt:
         print("\n[INFO] Arrêt demandé par l'utilisateur")
@@ -387,15 +650,20 @@ def main():
         import traceback
         traceback.print_exc()
     finally:
+        gc.unfreeze()
+        gc.enable()
         print("Nettoyage...")
         try:
             if conn:
                 conn.close()
             if sock:
                 sock.close()
-            if world:
-                for actor in world.get_actors().filter('vehicle.*'):
-                    actor.destroy()
+            # Destruction ciblée des acteurs créés, sans parcourir tout le monde
+            if client:
+                for resp in client.apply_batch_sync([
+                        carla.command.DestroyActor(actor.id) for actor in (ego, cyclist) if actor]):
+                    if resp.has_error():
+                        print(f"Erreur destruction acteur {resp.actor_id}: {resp.error}")
         except Exception as e:
             print(f"Erreur nettoyage: {e}")
         
@@ -405,6 +673,8 @@ def main():
             pass
         
         try:
+            if plotter:
+                plotter.close()
             plt.close('all')
         except:
             pass